@@ -1,14 +1,23 @@
 # config.py
 
+import numpy as np
+
 # --- Simulation Environment ---
 NUM_ACCOUNTS = 50000
 NUM_EPOCHS = 100
 EPOCH_DURATION_S = 5 * 60  # 5 minutes in seconds
+PROGRESS_INTERVAL = 10  # Print simulation progress every N epochs
+# Directory for memoized per-run results (relative to the working directory); None disables it
+RESULTS_CACHE_DIR = 'cache'
 
 # --- Workload Generation ---
 # Baseline traffic
 TX_PER_EPOCH_BASELINE = 80000
 POWER_LAW_ALPHA = 2.5  # Controls the skew of transactions
+# Seed for the shared workload replayed by every protocol in a scenario
+WORKLOAD_SEED = 42
+# Seed for randomized community detection, so one workload always gives one partition
+COMMUNITY_SEED = 0
 
 # Event-Driven Spike
 SPIKE_EPOCH = 50
@@ -16,6 +25,10 @@ SPIKE_TX_COUNT = 400000  # A massive spike
 NFT_CLUSTER_SIZE = 10
 # Accounts from 1000 to 1009 are designated as the NFT dApp contracts
 NFT_CLUSTER_ACCOUNTS = set(range(1000, 1000 + NFT_CLUSTER_SIZE))
+# Array forms of the cluster for vectorized sampling and membership tests
+NFT_ARR = np.array(sorted(NFT_CLUSTER_ACCOUNTS), dtype=np.int32)
+NFT_MASK = np.zeros(NUM_ACCOUNTS, dtype=bool)
+NFT_MASK[NFT_ARR] = True
 
 # --- Evaluation Metrics ---
 # Latency assumptions (in seconds)
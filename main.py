@@ -3,29 +3,51 @@
 import pandas as pd
 from collections import defaultdict
 import os  # Import the os module
+from concurrent.futures import ProcessPoolExecutor
 import config
-from simulator import Simulator
+from simulator import Simulator, generate_workload_sequence, numba
 from protocols import StaticProtocol, CLPAProtocol, DBSRPMLProtocol, ProShardProtocol
 
+def _init_worker():
+    """Limits each worker's Numba kernel to one thread, since the pool already uses every core."""
+    if numba is not None:
+        numba.set_num_threads(1)
+
+def _run_one(proto_class, num_shards, spike_epoch):
+    """Runs a single simulation; executed in a worker process."""
+    # Workers do not share the parent's config module, so apply overrides explicitly
+    config.SPIKE_EPOCH = spike_epoch
+    # The seeded workload is loaded from the on-disk cache populated in _run_jobs,
+    # and finished runs are memoized on disk under the same seed
+    sim = Simulator(proto_class(num_shards=num_shards, num_accounts=config.NUM_ACCOUNTS),
+                    seed=config.WORKLOAD_SEED)
+    return sim.protocol.name, sim.run()
+
+def _run_jobs(jobs, spike_epoch=None):
+    """Runs independent (proto_class, num_shards) simulations in parallel, preserving order."""
+    if spike_epoch is None:
+        spike_epoch = config.SPIKE_EPOCH
+    # Generate the scenario's workload once so all protocols replay identical traffic
+    generate_workload_sequence(config.NUM_EPOCHS, config.WORKLOAD_SEED, spike_epoch=spike_epoch)
+    proto_classes, shard_counts = zip(*jobs)
+    with ProcessPoolExecutor(max_workers=os.cpu_count(), initializer=_init_worker) as executor:
+        return list(executor.map(_run_one, proto_classes, shard_counts, [spike_epoch] * len(jobs)))
+
 def run_scenario_1(protocols):
     """Steady-State Baseline Performance (S=16)"""
     print("\n\n" + "="*20 + " SCENARIO 1: Steady-State Baseline " + "="*20)
     results = []
-    # Temporarily disable the spike for this scenario
-    original_spike_epoch = config.SPIKE_EPOCH
-    config.SPIKE_EPOCH = -1 
+    # Disable the spike for this scenario
+    runs = _run_jobs([(proto_class, 16) for proto_class in protocols], spike_epoch=-1)
 
-    for proto_class in protocols:
-        sim = Simulator(proto_class(num_shards=16, num_accounts=config.NUM_ACCOUNTS))
-        df = sim.run()
+    for name, df in runs:
         results.append({
-            'Protocol': sim.protocol.name,
+            'Protocol': name,
             'Avg. Throughput (TPS)': df['throughput'].mean(),
             'Avg. Latency (s)': df['avg_latency'].mean(),
             'CST Ratio (%)': df['cst_ratio'].mean()
         })
     
-    config.SPIKE_EPOCH = original_spike_epoch # Restore config
     df_results = pd.DataFrame(results)
     
     print("\n--- Results for Scenario 1 ---")
@@ -41,12 +63,12 @@ def run_scenario_2(protocols):
     print("\n\n" + "="*20 + " SCENARIO 2: Sudden Workload Spike " + "="*20)
     results = []
     
-    for proto_class in protocols:
-        sim = Simulator(proto_class(num_shards=16, num_accounts=config.NUM_ACCOUNTS))
-        df = sim.run()
+    runs = _run_jobs([(proto_class, 16) for proto_class in protocols])
+
+    for name, df in runs:
         spike_data = df[df['epoch'] == config.SPIKE_EPOCH].iloc[0]
         results.append({
-            'Protocol': sim.protocol.name,
+            'Protocol': name,
             'Peak Latency (s)': spike_data['avg_latency'],
             'Peak CST Ratio (%)': spike_data['cst_ratio'],
             'Peak Imbalance': f"{spike_data['imbalance']:.1f}x"
@@ -68,13 +90,13 @@ def run_scenario_3(protocols):
     shard_counts = [4, 16, 32, 64]
     results_dict = defaultdict(list)
 
-    for proto_class in protocols:
-        for s in shard_counts:
-            print(f"\nTesting {proto_class.__name__} with S={s}...")
-            sim = Simulator(proto_class(num_shards=s, num_accounts=config.NUM_ACCOUNTS))
-            df = sim.run()
-            # Use max throughput as the metric
-            results_dict[sim.protocol.name].append(int(df['throughput'].max())) # Cast to int for cleaner CSV
+    jobs = [(proto_class, s) for proto_class in protocols for s in shard_counts]
+    print(f"\nTesting {len(protocols)} protocols with S={shard_counts}...")
+    runs = _run_jobs(jobs)
+
+    for name, df in runs:
+        # Use max throughput as the metric
+        results_dict[name].append(int(df['throughput'].max())) # Cast to int for cleaner CSV
 
     df_results = pd.DataFrame(results_dict, index=[f"S={s}" for s in shard_counts]).T
     df_results.index.name = "Protocol"
@@ -92,12 +114,12 @@ def run_scenario_4(protocols):
     print("\n\n" + "="*20 + " SCENARIO 4: Reconfiguration Cost " + "="*20)
     results = []
     
-    for proto_class in protocols:
-        sim = Simulator(proto_class(num_shards=16, num_accounts=config.NUM_ACCOUNTS))
-        df = sim.run()
+    runs = _run_jobs([(proto_class, 16) for proto_class in protocols])
+
+    for name, df in runs:
         avg_reconfig = df[df['epoch'] > 0]['reconfig_cost'].mean() # Exclude initial setup
         results.append({
-            'Protocol': sim.protocol.name,
+            'Protocol': name,
             'Avg. % of Accounts Migrated': f"{avg_reconfig:.1f}%"
         })
     
@@ -1,13 +1,34 @@
 # protocols.py
 
 import random
+import heapq
+import numpy as np
 import networkx as nx
 from abc import ABC, abstractmethod
-from collections import defaultdict
 import config
 
+try:
+    import igraph
+except ImportError:  # igraph is optional; fall back to networkx greedy modularity
+    igraph = None
+
+try:
+    from scipy.sparse import coo_matrix
+    from sknetwork.clustering import Louvain
+except ImportError:  # scikit-network is optional; fall back to the graph-based path
+    Louvain = None
+
+# Optional backends in use; they produce different partitions, so they key cached results
+BACKENDS = {'igraph': igraph is not None, 'scikit-network': Louvain is not None}
+
+# Placeholder for an epoch with no recorded transactions
+EMPTY_WORKLOAD = np.empty((0, 2), dtype=np.int32)
+
 class ShardingProtocol(ABC):
     """Abstract base class for all sharding protocols."""
+    # Static protocols never move accounts, letting the simulator skip reconfiguration cost
+    is_static = False
+
     def __init__(self, num_shards, num_accounts):
         self.num_shards = num_shards
         self.num_accounts = num_accounts
@@ -15,27 +36,77 @@ class ShardingProtocol(ABC):
 
     @abstractmethod
     def reconfigure(self, current_partition, workload_history, epoch):
-        """Returns the new partition map {account_id: shard_id}."""
+        """Returns the new partition as a dense int16 array mapping account_id -> shard_id."""
         pass
 
     def _create_partition_from_communities(self, communities):
-        """Helper to convert networkx community list to a partition map."""
-        partition = {}
+        """Helper to convert a community list to a dense partition array."""
         # Ensure all accounts are assigned, even if community detection misses some
-        for acc_id in range(self.num_accounts):
-            partition[acc_id] = acc_id % self.num_shards
+        partition = (np.arange(self.num_accounts) % self.num_shards).astype(np.int16)
         
         for shard_id, community in enumerate(communities):
-            for account in community:
-                partition[account] = shard_id
+            partition[list(community)] = shard_id
         return partition
 
+    def _modularity_communities(self, G, weight=None):
+        """
+        Splits G into at most num_shards modularity communities.
+        Uses igraph's Louvain (C core) when available, merging the smallest
+        communities until the shard count is reached.
+        """
+        if igraph is None:
+            return nx.community.greedy_modularity_communities(G, best_n=self.num_shards, weight=weight)
+
+        edges = list(G.edges(data=weight or 'weight', default=1))
+        # Louvain visits vertices in random order; reseed so each graph yields one result
+        igraph.set_random_number_generator(random.Random(config.COMMUNITY_SEED))
+        g = igraph.Graph(n=self.num_accounts, edges=[(u, v) for u, v, _ in edges])
+        clustering = g.community_multilevel(weights=[w for _, _, w in edges] if weight else None)
+
+        # Isolated accounts are not graph nodes and keep their default shard
+        nodes = np.fromiter(G.nodes, dtype=np.int64, count=G.number_of_nodes())
+        communities = self._communities_from_labels(np.asarray(clustering.membership), nodes)
+        return self._merge_communities(communities)
+
+    def _communities_from_labels(self, labels, nodes):
+        """Groups the given account ids by their community label."""
+        node_labels = labels[nodes]
+        order = np.argsort(node_labels, kind='stable')
+        bounds = np.flatnonzero(np.diff(node_labels[order])) + 1
+        return [com.tolist() for com in np.split(nodes[order], bounds)]
+
+    def _merge_communities(self, communities):
+        """Merges the smallest communities until at most num_shards remain, largest first."""
+        heap = [(len(com), i, com) for i, com in enumerate(communities)]
+        heapq.heapify(heap)
+        next_id = len(heap)
+        while len(heap) > self.num_shards:
+            size_a, _, com_a = heapq.heappop(heap)
+            size_b, _, com_b = heapq.heappop(heap)
+            heapq.heappush(heap, (size_a + size_b, next_id, com_a + com_b))
+            next_id += 1
+        return [com for _, _, com in sorted(heap, key=lambda item: item[0], reverse=True)]
+
+    def _unique_edge_keys(self, txs_arr):
+        """Unique undirected edges of an (N, 2) transaction array as u * num_accounts + v keys (u <= v), with counts."""
+        lo = np.minimum(txs_arr[:, 0], txs_arr[:, 1]).astype(np.int64)
+        hi = np.maximum(txs_arr[:, 0], txs_arr[:, 1])
+        return np.unique(lo * self.num_accounts + hi, return_counts=True)
+
+    def _edge_weights(self, txs_arr):
+        """Collapses an (N, 2) transaction array into unique undirected edges and their counts."""
+        keys, w = self._unique_edge_keys(txs_arr)
+        u, v = np.divmod(keys, self.num_accounts)
+        return np.column_stack((u, v)), w
+
 class StaticProtocol(ShardingProtocol):
     """Static sharding based on account address (ID). Similar to Monoxide."""
+    is_static = True
+
     def __init__(self, num_shards, num_accounts):
         super().__init__(num_shards, num_accounts)
         self.name = "Static (Address-based)"
-        self.partition = {i: i % self.num_shards for i in range(num_accounts)}
+        self.partition = (np.arange(num_accounts) % self.num_shards).astype(np.int16)
 
     def reconfigure(self, current_partition, workload_history, epoch):
         # Static protocol never reconfigures
@@ -48,14 +119,25 @@ class ReactiveProtocol(ShardingProtocol):
         if epoch == 0 or not workload_history:
             return G
         
-        last_epoch_txs = workload_history.get(epoch - 1, [])
-        for src, dst in last_epoch_txs:
-            if G.has_edge(src, dst):
-                G[src][dst]['weight'] += 1
-            else:
-                G.add_edge(src, dst, weight=1)
+        last_epoch_txs = workload_history.get(epoch - 1, EMPTY_WORKLOAD)
+        keys, w = self._unique_edge_keys(last_epoch_txs)
+        u, v = np.divmod(keys, self.num_accounts)
+        G.add_weighted_edges_from(zip(u.tolist(), v.tolist(), w.tolist()))
         return G
 
+    def _build_adjacency_from_history(self, workload_history, epoch):
+        """Symmetric binary CSR adjacency of the previous epoch's transaction graph, or None if empty."""
+        if epoch == 0 or not workload_history:
+            return None
+
+        last_epoch_txs = workload_history.get(epoch - 1, EMPTY_WORKLOAD)
+        uniq, w = self._edge_weights(last_epoch_txs)
+        if len(w) == 0:
+            return None
+        A = coo_matrix((np.ones(len(w), dtype=np.int64), (uniq[:, 0], uniq[:, 1])),
+                       shape=(self.num_accounts, self.num_accounts))
+        return (A + A.T).tocsr()
+
 class CLPAProtocol(ReactiveProtocol):
     """Reactive protocol using Community Label Propagation Algorithm."""
     def __init__(self, num_shards, num_accounts):
@@ -75,20 +157,27 @@ class CLPAProtocol(ReactiveProtocol):
 class DBSRPMLProtocol(ReactiveProtocol):
     """
     Represents an advanced reactive protocol (like DBSRP-ML).
-    Uses a more robust, weighted community detection algorithm (Greedy Modularity).
+    Uses a more robust community detection algorithm (unweighted modularity maximisation).
     """
     def __init__(self, num_shards, num_accounts):
         super().__init__(num_shards, num_accounts)
         self.name = "DBSRP-ML (Advanced Reactive)"
 
     def reconfigure(self, current_partition, workload_history, epoch):
-        G = self._build_graph_from_history(workload_history, epoch)
-        if not G.nodes:
+        if Louvain is None:
+            G = self._build_graph_from_history(workload_history, epoch)
+            if not G.nodes:
+                return current_partition
+            communities = self._modularity_communities(G)
+            return self._create_partition_from_communities(communities)
+
+        # Cluster the sparse adjacency directly, skipping networkx graph construction
+        A = self._build_adjacency_from_history(workload_history, epoch)
+        if A is None:
             return current_partition
-        
-        # --- FIX IS HERE ---
-        # Changed n_communities to best_n
-        communities = nx.community.greedy_modularity_communities(G, best_n=self.num_shards)
+        labels = Louvain().fit_predict(A)
+        active = np.flatnonzero(A.getnnz(axis=1))
+        communities = self._merge_communities(self._communities_from_labels(labels, active))
         return self._create_partition_from_communities(communities)
 
 
@@ -97,8 +186,8 @@ class ProShardProtocol(ShardingProtocol):
     def __init__(self, num_shards, num_accounts):
         super().__init__(num_shards, num_accounts)
         self.name = "ProShard (Proactive)"
-        self.historical_activity = defaultdict(int)
-        self.predicted_activity = defaultdict(int)
+        self.hist_arr = np.zeros(num_accounts, dtype=np.float32)
+        self.predicted_arr = np.zeros(num_accounts, dtype=np.float32)
 
     def _predict(self, workload_history, epoch):
         """
@@ -108,68 +197,53 @@ class ProShardProtocol(ShardingProtocol):
         """
         # 1. Update historical activity with data from last epoch
         if epoch > 0:
-            last_epoch_txs = workload_history.get(epoch - 1, [])
-            last_epoch_activity = defaultdict(int)
-            for src, dst in last_epoch_txs:
-                last_epoch_activity[src] += 1
-                last_epoch_activity[dst] += 1
-
-            for acc, activity in last_epoch_activity.items():
-                # Apply EMA update
-                self.historical_activity[acc] = (config.EMA_ALPHA * activity) + \
-                                                ((1 - config.EMA_ALPHA) * self.historical_activity[acc])
+            last_epoch_txs = workload_history.get(epoch - 1, EMPTY_WORKLOAD)
+            activity = np.bincount(last_epoch_txs.ravel(), minlength=self.num_accounts).astype(np.float32)
+            # Apply EMA update (accounts idle last epoch decay as well)
+            self.hist_arr = (config.EMA_ALPHA * activity) + ((1 - config.EMA_ALPHA) * self.hist_arr)
 
         # 2. Generate predictions for the *next* epoch
-        self.predicted_activity.clear()
-        for acc, activity in self.historical_activity.items():
-            if activity > config.PREDICTION_ACTIVITY_THRESHOLD:
-                self.predicted_activity[acc] = activity # Simple EMA prediction
+        mask = self.hist_arr > config.PREDICTION_ACTIVITY_THRESHOLD
+        self.predicted_arr[:] = 0
+        self.predicted_arr[mask] = self.hist_arr[mask] # Simple EMA prediction
 
         # 3. **The Proactive Oracle**: Predict the NFT spike one epoch before it happens
         if epoch == config.SPIKE_EPOCH - 1:
             spike_prediction_value = config.SPIKE_TX_COUNT / config.NFT_CLUSTER_SIZE
-            for acc in config.NFT_CLUSTER_ACCOUNTS:
-                self.predicted_activity[acc] += spike_prediction_value
+            self.predicted_arr[config.NFT_ARR] += spike_prediction_value
 
     def _build_predictive_affinity_graph(self, workload_history, epoch):
         G = nx.Graph()
         
         # 1. Historical Component (H)
-        historical_weights = defaultdict(int)
+        last_epoch_txs = EMPTY_WORKLOAD
         if epoch > 0:
-             last_epoch_txs = workload_history.get(epoch-1, [])
-             for src, dst in last_epoch_txs:
-                 historical_weights[(min(src,dst), max(src,dst))] += 1
+             last_epoch_txs = workload_history.get(epoch-1, EMPTY_WORKLOAD)
+        uniq, w = self._edge_weights(last_epoch_txs)
+        u, v = uniq[:, 0], uniq[:, 1]
 
         # 2. Combine all factors into edge weights
-        all_edges = set(historical_weights.keys())
-
-        for u, v in all_edges:
-            # Historical score
-            h_score = historical_weights.get((u, v), 0)
-            
-            # Predictive score (P)
-            p_score = self.predicted_activity.get(u, 0) * self.predicted_activity.get(v, 0)
-            
-            # Semantic score (S)
-            is_semantic_match = (u in config.NFT_CLUSTER_ACCOUNTS and v in config.NFT_CLUSTER_ACCOUNTS)
-            s_score = 1.0 if is_semantic_match else 0.0
-            
-            # Normalize scores (simple max-based normalization for simulation)
-            # A more robust implementation would use proper scaling
-            max_h = max(historical_weights.values()) if historical_weights else 1
-            max_p = max(self.predicted_activity.values())**2 if self.predicted_activity else 1
-            
-            norm_h = h_score / max_h if max_h > 0 else 0
-            norm_p = p_score / max_p if max_p > 0 else 0
-            
-            # Calculate final PAG edge weight
-            weight = (config.PAG_WEIGHTS['historical'] * norm_h +
-                      config.PAG_WEIGHTS['predictive'] * norm_p +
-                      config.PAG_WEIGHTS['semantic'] * s_score)
-            
-            if weight > 0:
-                G.add_edge(u, v, weight=weight)
+        # Predictive score (P)
+        p_score = self.predicted_arr[u] * self.predicted_arr[v]
+        
+        # Semantic score (S)
+        s_score = (config.NFT_MASK[u] & config.NFT_MASK[v]).astype(np.float64)
+        
+        # Normalize scores (simple max-based normalization for simulation)
+        # A more robust implementation would use proper scaling
+        max_h = w.max() if len(w) else 1
+        max_p = self.predicted_arr.max()**2
+        
+        norm_h = w / max_h
+        norm_p = p_score / max_p if max_p > 0 else np.zeros(len(w))
+        
+        # Calculate final PAG edge weight
+        weight = (config.PAG_WEIGHTS['historical'] * norm_h +
+                  config.PAG_WEIGHTS['predictive'] * norm_p +
+                  config.PAG_WEIGHTS['semantic'] * s_score)
+        
+        keep = weight > 0
+        G.add_weighted_edges_from(zip(u[keep].tolist(), v[keep].tolist(), weight[keep].tolist()))
         
         return G
 
@@ -184,5 +258,5 @@ class ProShardProtocol(ShardingProtocol):
             return current_partition
             
         # 3. Partition the PAG
-        communities = nx.community.greedy_modularity_communities(G, best_n=self.num_shards, weight='weight')
+        communities = self._modularity_communities(G, weight='weight')
         return self._create_partition_from_communities(communities)
\ No newline at end of file
@@ -1,63 +1,186 @@
 # simulator.py
 
+import os
+import sys
+import pickle
+import hashlib
+import inspect
+import tempfile
 import numpy as np
 import pandas as pd
-from collections import defaultdict
 import config
 
+try:
+    import numba
+except ImportError:  # Numba is optional; fall back to the NumPy metrics path
+    numba = None
+
+
+if numba is not None:
+    @numba.njit(parallel=True, cache=True)
+    def _process_kernel(src, dst, part, num_bins, num_chunks, latency_intra, latency_cross):
+        """Single-pass CST count, latency sum and shard-load histogram over an epoch."""
+        num_txs = src.shape[0]
+        chunk_size = (num_txs + num_chunks - 1) // num_chunks
+        local_loads = np.zeros((num_chunks, num_bins), dtype=np.int64)
+        local_cst = np.zeros(num_chunks, dtype=np.int64)
+
+        for c in numba.prange(num_chunks):
+            start = c * chunk_size
+            end = min(start + chunk_size, num_txs)
+            cst = 0
+            for i in range(start, end):
+                src_shard = part[src[i]]
+                dst_shard = part[dst[i]]
+                local_loads[c, src_shard] += 1
+                local_loads[c, dst_shard] += 1
+                if src_shard != dst_shard:
+                    cst += 1
+            local_cst[c] = cst
+
+        num_cst = local_cst.sum()
+        total_latency = num_cst * latency_cross + (num_txs - num_cst) * latency_intra
+        return num_cst, total_latency, local_loads.sum(axis=0)
+
+
+# Identifies the sampling scheme in on-disk cache keys; bump when generation changes
+WORKLOAD_GENERATOR = 'truncated-power-law/pcg64'
+
+def _power_law_cdf(num_accounts):
+    """Cumulative weights of a power law truncated to [0, num_accounts)."""
+    probs = np.arange(1, num_accounts + 1, dtype=np.float64) ** -config.POWER_LAW_ALPHA
+    cdf = np.cumsum(probs / probs.sum())
+    cdf[-1] = 1.0  # Guard against rounding so every sample maps to a valid account
+    return cdf
+
+def _generate_epoch_workload(epoch, num_accounts, spike_epoch, cdf, rng, u_buf):
+    """Generates transactions for one epoch as an (N, 2) array of (src, dst)."""
+    # 1. Baseline traffic (Power-law)
+    # Inverse-CDF sampling of interacting accounts from a truncated Zipfian distribution.
+    # Uniform draws go into a buffer reused across epochs.
+    rng.random(out=u_buf)
+    accounts = np.searchsorted(cdf, u_buf, side='right').astype(np.int32)
+    txs = accounts.reshape(-1, 2)
+    
+    # 2. Event-driven spike
+    if epoch == spike_epoch:
+        spike_src = rng.integers(0, num_accounts, config.SPIKE_TX_COUNT)
+        spike_dst = config.NFT_ARR[rng.integers(0, config.NFT_CLUSTER_SIZE, config.SPIKE_TX_COUNT)]
+        spike = np.stack((spike_src, spike_dst), axis=1).astype(np.int32)
+        txs = np.concatenate((txs, spike), axis=0)
+        
+    return txs
+
+def _atomic_write(path, write):
+    """Calls write(file) on a temp file beside path, then renames it into place."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def generate_workload_sequence(num_epochs, seed, num_accounts=None, spike_epoch=None):
+    """
+    Returns the list of per-epoch transaction arrays for a seed.
+    Seeded sequences are memoized on disk so every protocol replays the same workload.
+    """
+    if num_accounts is None:
+        num_accounts = config.NUM_ACCOUNTS
+    if spike_epoch is None:
+        spike_epoch = config.SPIKE_EPOCH
+
+    path = None
+    if seed is not None:
+        params = (WORKLOAD_GENERATOR, num_epochs, num_accounts, spike_epoch, config.TX_PER_EPOCH_BASELINE,
+                  config.POWER_LAW_ALPHA, config.SPIKE_TX_COUNT, sorted(config.NFT_CLUSTER_ACCOUNTS))
+        key = hashlib.md5(repr(params).encode()).hexdigest()[:8]
+        path = f"workload_seed{seed}_{key}.npz"
+        if os.path.exists(path):
+            with np.load(path) as data:
+                return [data[f"arr_{epoch}"] for epoch in range(num_epochs)]
+
+    rng = np.random.default_rng(seed)
+    cdf = _power_law_cdf(num_accounts)
+    u_buf = np.empty(config.TX_PER_EPOCH_BASELINE * 2, dtype=np.float64)
+    workload = [_generate_epoch_workload(epoch, num_accounts, spike_epoch, cdf, rng, u_buf)
+                for epoch in range(num_epochs)]
+    if path is not None:
+        # Write atomically so an interrupted run never leaves a truncated cache file
+        _atomic_write(path, lambda f: np.savez_compressed(f, *workload))
+    return workload
+
+
+# Per-epoch metrics row, stored compactly in a preallocated structured array
+RESULTS_DTYPE = np.dtype([
+    ('epoch', 'i2'),
+    ('throughput', 'f4'),
+    ('avg_latency', 'f4'),
+    ('cst_ratio', 'f4'),
+    ('imbalance', 'f4'),
+    ('num_cst', 'i4'),
+    ('reconfig_cost', 'f4'),
+])
+
+def _config_hash():
+    """Fingerprint of every setting in config, used to key on-disk caches."""
+    settings = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    return hashlib.md5(pickle.dumps(sorted(settings.items()))).hexdigest()
+
+def _code_hash(protocol):
+    """Fingerprint of the protocol and simulator code, plus the optional backends in use."""
+    protocol_module = inspect.getmodule(type(protocol))
+    backends = dict(getattr(protocol_module, 'BACKENDS', {}), numba=numba is not None)
+    sources = (inspect.getsource(protocol_module), inspect.getsource(sys.modules[__name__]))
+    return hashlib.md5(pickle.dumps((sources, sorted(backends.items())))).hexdigest()
+
+
 class Simulator:
-    def __init__(self, protocol):
+    def __init__(self, protocol, workload=None, seed=None):
         self.protocol = protocol
         self.num_accounts = protocol.num_accounts
         self.num_shards = protocol.num_shards
 
-        self.partition = {i: i % self.num_shards for i in range(self.num_accounts)}
+        # Dense account -> shard array
+        self.partition = (np.arange(self.num_accounts) % self.num_shards).astype(np.int16)
+        # The workload is generated (or loaded) lazily so cached runs skip it entirely
+        self.workload = workload
+        self.seed = seed
+        # A caller-supplied workload is not identified by the seed, so its runs are never cached
+        self.custom_workload = workload is not None
         self.workload_history = {}
-        self.results = []
-
-    def _generate_workload(self, epoch):
-        """Generates transactions for the current epoch."""
-        # 1. Baseline traffic (Power-law)
-        # Generate pairs of interacting accounts based on a Zipfian distribution
-        s = np.random.zipf(config.POWER_LAW_ALPHA, config.TX_PER_EPOCH_BASELINE * 2)
-        accounts = s % self.num_accounts
-        txs = list(zip(accounts[::2], accounts[1::2]))
-        
-        # 2. Event-driven spike
-        if epoch == config.SPIKE_EPOCH:
-            spike_src = np.random.randint(0, self.num_accounts, config.SPIKE_TX_COUNT)
-            spike_dst = np.random.choice(list(config.NFT_CLUSTER_ACCOUNTS), config.SPIKE_TX_COUNT)
-            txs.extend(list(zip(spike_src, spike_dst)))
-            
-        return txs
+        self.results = np.empty(config.NUM_EPOCHS, dtype=RESULTS_DTYPE)
 
-    def _process_transactions(self, transactions, current_partition):
+    def _process_transactions(self, txs_arr, part_arr):
         """Simulates transaction processing and gathers metrics for the epoch."""
-        num_cst = 0
-        total_latency = 0
-        shard_load = defaultdict(int)
-
-        for src, dst in transactions:
-            src_shard = current_partition.get(src)
-            dst_shard = current_partition.get(dst)
+        num_txs = len(txs_arr)
+        # Fixed-size load histogram indexed by shard id. Community-based
+        # protocols may emit more communities than shards, so size it to fit.
+        num_bins = max(self.num_shards, int(part_arr.max()) + 1)
+        if numba is not None:
+            num_cst, total_latency, shard_load = _process_kernel(
+                txs_arr[:, 0], txs_arr[:, 1], part_arr, num_bins, numba.get_num_threads(),
+                config.LATENCY_INTRA_SHARD, config.LATENCY_CROSS_SHARD)
+            num_cst = int(num_cst)
+        else:
+            src_shard = part_arr[txs_arr[:, 0]]
+            dst_shard = part_arr[txs_arr[:, 1]]
 
-            shard_load[src_shard] += 1
-            shard_load[dst_shard] += 1
-
-            if src_shard != dst_shard:
-                num_cst += 1
-                total_latency += config.LATENCY_CROSS_SHARD
-            else:
-                total_latency += config.LATENCY_INTRA_SHARD
+            num_cst = int((src_shard != dst_shard).sum())
+            total_latency = (num_cst * config.LATENCY_CROSS_SHARD +
+                             (num_txs - num_cst) * config.LATENCY_INTRA_SHARD)
+            shard_load = np.bincount(np.concatenate((src_shard, dst_shard)),
+                                     minlength=num_bins).astype(np.int64, copy=False)
         
-        num_txs = len(transactions)
         avg_latency = total_latency / num_txs if num_txs > 0 else 0
         cst_ratio = (num_cst / num_txs) * 100 if num_txs > 0 else 0
         throughput = num_txs / config.EPOCH_DURATION_S
 
         # Workload imbalance
-        loads = [v for v in shard_load.values() if v > 0]
-        imbalance = max(loads) / min(loads) if len(loads) > 1 else 1.0
+        positive = shard_load[shard_load > 0]
+        imbalance = float(positive.max() / positive.min()) if len(positive) > 1 else 1.0
         
         return {
             'throughput': throughput,
@@ -67,30 +190,58 @@ class Simulator:
             'num_cst': num_cst
         }
 
+    def _results_cache_path(self):
+        """Path of the memoized results for this run, or None if it cannot be cached."""
+        if self.seed is None or self.custom_workload or config.RESULTS_CACHE_DIR is None:
+            return None
+        key = hashlib.md5(pickle.dumps((self.protocol.name, self.num_shards, self.num_accounts,
+                                        _config_hash(), _code_hash(self.protocol),
+                                        WORKLOAD_GENERATOR, self.seed))).hexdigest()
+        return os.path.join(config.RESULTS_CACHE_DIR, f"run_{key}.pkl")
+
     def run(self):
         """Runs the full simulation for NUM_EPOCHS."""
+        cache_path = self._results_cache_path()
+        if cache_path is not None and os.path.exists(cache_path):
+            print(f"\n--- Loaded cached results for: {self.protocol.name} ---")
+            return pd.read_pickle(cache_path)
+
+        if self.workload is None:
+            self.workload = generate_workload_sequence(config.NUM_EPOCHS, self.seed,
+                                                       num_accounts=self.num_accounts)
+
         print(f"\n--- Running Simulation for: {self.protocol.name} ---")
         for epoch in range(config.NUM_EPOCHS):
-            print(f"\rEpoch {epoch+1}/{config.NUM_EPOCHS}", end="")
+            if epoch % config.PROGRESS_INTERVAL == 0 or epoch == config.NUM_EPOCHS - 1:
+                print(f"\rEpoch {epoch+1}/{config.NUM_EPOCHS}", end="")
 
-            # 1. Generate this epoch's workload
-            transactions = self._generate_workload(epoch)
-            self.workload_history[epoch] = [(t[0], t[1]) for t in transactions]
+            # 1. Fetch this epoch's pre-generated workload
+            transactions = self.workload[epoch]
+            self.workload_history[epoch] = transactions
 
             # 2. Protocol decides on new partition
-            old_partition = self.partition.copy()
-            new_partition = self.protocol.reconfigure(old_partition, self.workload_history, epoch)
-            self.partition = new_partition
+            # 3. Calculate reconfiguration cost (static protocols never move accounts)
+            if self.protocol.is_static:
+                self.partition = self.protocol.reconfigure(self.partition, self.workload_history, epoch)
+                reconfig_cost = 0.0
+            else:
+                old_partition = self.partition.copy()
+                new_partition = self.protocol.reconfigure(old_partition, self.workload_history, epoch)
+                self.partition = new_partition
 
-            # 3. Calculate reconfiguration cost
-            moved_accounts = sum(1 for acc, shd in old_partition.items() if new_partition.get(acc) != shd)
-            reconfig_cost = (moved_accounts / self.num_accounts) * 100
+                moved_accounts = int(np.count_nonzero(old_partition != new_partition))
+                reconfig_cost = (moved_accounts / self.num_accounts) * 100
 
             # 4. Process transactions with the new partition and get metrics
             epoch_metrics = self._process_transactions(transactions, self.partition)
             epoch_metrics['epoch'] = epoch
             epoch_metrics['reconfig_cost'] = reconfig_cost
             
-            self.results.append(epoch_metrics)
+            self.results[epoch] = tuple(epoch_metrics[name] for name in RESULTS_DTYPE.names)
         print("\nSimulation complete.")
-        return pd.DataFrame(self.results)
\ No newline at end of file
+        df = pd.DataFrame(self.results)
+
+        if cache_path is not None:
+            os.makedirs(config.RESULTS_CACHE_DIR, exist_ok=True)
+            _atomic_write(cache_path, df.to_pickle)
+        return df
\ No newline at end of file